@@ -1,15 +1,30 @@
+import contextlib
+import importlib.util
+import io
 import math
 import numbers
+import operator
 import re
+import string
 import unittest
-import numpy
+from collections import deque
+from functools import lru_cache
+from unittest import mock
 
 __author__ = "Peter Skaar Nordby"
 
+TOK_NUM, TOK_FUNC, TOK_OP, TOK_LPAREN, TOK_RPAREN, TOK_VAR = range(6)
+
+_DIGITS = frozenset("0123456789.")
+_NUMBER_CHARS = _DIGITS | {'-'}
+_NORMALIZE = str.maketrans(string.ascii_lowercase, string.ascii_uppercase, ' ')
+
 
 class Container():
+    __slots__ = ('_items',)
+
     def __init__(self):
-        self._items = []
+        self._items = deque()
 
     def size(self):
         return len(self._items)
@@ -28,9 +43,11 @@ class Container():
 
 
 class Stack(Container):
+    __slots__ = ()
+
     def pop(self):
         assert not self.is_empty()
-        return self._items.pop(-1)
+        return self._items.pop()
 
     def peek(self):
         assert not self.is_empty()
@@ -38,9 +55,11 @@ class Stack(Container):
 
 
 class Queue(Container):
+    __slots__ = ()
+
     def pop(self):
         assert not self.is_empty()
-        return self._items.pop(0)
+        return self._items.popleft()
 
     def peek(self):
         assert not self.is_empty()
@@ -69,14 +88,14 @@ class TestCalculator(unittest.TestCase):
         self.assertEqual(fist_in_line, 2)
 
     def test_function(self):
-        exponential_function = Function(numpy.exp)
-        sin_func = Function(numpy.sin)
+        exponential_function = Function(math.exp)
+        sin_func = Function(math.sin)
         self.assertEqual(exponential_function.execute(
             sin_func.execute(0)), math.exp(math.sin(0)))
 
     def test_operator(self):
-        add_op = Operator(numpy.add, 0)
-        multiply_op = Operator(numpy.multiply, 1)
+        add_op = Operator(operator.add, 0)
+        multiply_op = Operator(operator.mul, 1)
         self.assertEqual(add_op.execute(
             1, multiply_op.execute(2, 3)), 1+2*3)
 
@@ -87,36 +106,36 @@ class TestCalculator(unittest.TestCase):
 
     def test_rpn(self):
         calc = Calculator()
-        calc.output_queue.push(1)
-        calc.output_queue.push(2)
-        calc.output_queue.push(3)
-        calc.output_queue.push(calc.operators['MULTIPLY'])
-        calc.output_queue.push(calc.operators['ADD'])
-        calc.output_queue.push(calc.functions['EXP'])
-        self.assertEqual(calc.evaluate_rpn(calc.output_queue), math.exp(1+2*3))
+        rpn = Queue()
+        rpn.push(1)
+        rpn.push(2)
+        rpn.push(3)
+        rpn.push(calc.operators['MULTIPLY'])
+        rpn.push(calc.operators['ADD'])
+        rpn.push(calc.functions['EXP'])
+        self.assertEqual(calc.evaluate_rpn(rpn), math.exp(1+2*3))
 
     def test_notation(self):
         calc = Calculator()
         notation = Queue()
-        notation.push(calc.functions['EXP'])
-        notation.push('(')
-        notation.push(1)
-        notation.push(calc.operators['ADD'])
-        notation.push(2)
-        notation.push(calc.operators['MULTIPLY'])
-        notation.push(3)
-        notation.push(')')
-        self.assertEqual(calc.evaluate_notation(
-            notation).peek(), calc.output_queue.peek())
+        notation.push((TOK_FUNC, calc.functions['EXP']))
+        notation.push((TOK_LPAREN, None))
+        notation.push((TOK_NUM, 1))
+        notation.push((TOK_OP, calc.operators['ADD']))
+        notation.push((TOK_NUM, 2))
+        notation.push((TOK_OP, calc.operators['MULTIPLY']))
+        notation.push((TOK_NUM, 3))
+        notation.push((TOK_RPAREN, None))
+        self.assertEqual(calc.evaluate_notation(notation).peek(), 1)
 
     def test_parser(self):
         calc = Calculator()
         expected = Queue()
-        expected.push(2)
-        expected.push(calc.operators['ADD'])
-        expected.push(1)
-        expected.push(calc.operators['SUBTRACT'])
-        expected.push(3)
+        expected.push((TOK_NUM, 2))
+        expected.push((TOK_OP, calc.operators['ADD']))
+        expected.push((TOK_NUM, 1))
+        expected.push((TOK_OP, calc.operators['SUBTRACT']))
+        expected.push((TOK_NUM, 3))
         self.assertEqual(calc.parser(
             "2 add 1 subtract 3").peek(), expected.peek())
 
@@ -127,131 +146,319 @@ class TestCalculator(unittest.TestCase):
         self.assertEqual(calc.calculate_expression(
             "((15 divide (7 subtract  (1 add 1))) multiply 3) subtract (2 add (1 add 1))"), 5)
 
+    def test_unbalanced_parentheses(self):
+        calc = Calculator()
+        self.assertRaises(ValueError, calc.calculate_expression, "(1 add 2")
+        self.assertRaises(ValueError, calc.calculate_expression, "1 add 2)")
+
+    def test_divide_by_zero(self):
+        calc = Calculator()
+        self.assertRaises(ZeroDivisionError, calc.calculate_expression, "1 divide 0")
+        output = io.StringIO()
+        with mock.patch('builtins.input', side_effect=["1 divide 0", "1 add 2", KeyboardInterrupt]), \
+                contextlib.redirect_stdout(output):
+            main()
+        self.assertIn("Could not calculate expression", output.getvalue())
+        self.assertIn("The answer is 3", output.getvalue())
+
+    def test_minus_inside_number(self):
+        calc = Calculator()
+        self.assertRaises(ValueError, calc.calculate_expression, "1 - 2")
+        self.assertEqual(calc.calculate_expression("1 subtract -2"), 3)
+
+    def test_compile(self):
+        calc = Calculator()
+        expression = calc.compile("exp (1 add 2 multiply 3)")
+        self.assertEqual(expression(), math.exp(1+2*3))
+        self.assertEqual(expression(), calc.calculate_expression(
+            "exp (1 add 2 multiply 3)"))
+
+    def test_fold_constants(self):
+        calc = Calculator()
+        tokens = calc._drain(calc.evaluate_notation(
+            calc.parser("1 add 6 divide 2 add 4 multiply 5")))
+        self.assertEqual(calc._fold_constants(tokens), (24,))
+
+    def test_compile_cache_shared(self):
+        program = Calculator()._compile("1 add 2 multiply 3")
+        self.assertIs(Calculator()._compile("1 add 2 multiply 3"), program)
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') is None, "requires numpy")
+    def test_calculate_expression_batch(self):
+        calc = Calculator()
+        result = calc.calculate_expression_batch(
+            "exp (x add 2 multiply 3)", {'x': [0, 1, 2]})
+        self.assertEqual(list(result), [math.exp(x+2*3) for x in [0, 1, 2]])
+
+    @unittest.skipIf(importlib.util.find_spec('numpy') is None, "requires numpy")
+    def test_variable_name_collisions(self):
+        calc = Calculator()
+        self.assertEqual(list(calc.calculate_expression_batch("X1 add x1", {'x1': [1, 2]})), [2, 4])
+        for name in ('cost', 'addend', '2x', 'x(', ''):
+            self.assertRaisesRegex(ValueError, "Invalid variable name",
+                                   calc.calculate_expression_batch, "1 add x", {name: [1]})
+        self.assertRaisesRegex(ValueError, "Unknown variable: E3",
+                               calc.calculate_expression_batch, "1e3", {'e': [1]})
+
 
 class Function:
-    def __init__(self, func):
-        self.func = func
+    __slots__ = ('func', 'vector_name')
 
-    def execute(self, element, debug=False):
-        if not isinstance(element, numbers.Number):
-            raise TypeError("The element must be a number")
-        result = self.func(element)
+    def __init__(self, func, vector_name=None):
+        self.func = func
+        self.vector_name = vector_name
 
-        if debug:
-            print("Function: " + self.func.__name__
-                  + "\n{:f} = {:f}\n".format(element, result))
+    def execute(self, element):
+        return self.func(element)
 
+    def execute_debug(self, element):
+        result = self.func(element)
+        print("Function: " + self.func.__name__
+              + "\n{:f} = {:f}\n".format(element, result))
         return result
 
 
 class Operator:
-    def __init__(self, operator, strength):
+    __slots__ = ('operator', 'strength', 'vector_name')
+
+    def __init__(self, operator, strength, vector_name=None):
         self.operator = operator
         self.strength = strength
+        self.vector_name = vector_name
+
+    def execute(self, element1, element2):
+        return self.operator(element1, element2)
 
-    def execute(self, element1, element2, debug=False):
-        if not isinstance(element1, numbers.Number) or not isinstance(element2, numbers.Number):
-            raise TypeError("The element must be a number")
+    def execute_debug(self, element1, element2):
         result = self.operator(element1, element2)
+        print("Operator: " + self.operator.__name__
+              + "\n{:f}, {:f} = {:f}\n".format(element1, element2, result))
+        return result
 
-        if debug:
-            print("Operator: " + self.operator.__name__
-                  + "\n{:f}, {:f} = {:f}\n".format(element1, element2, result))
 
-        return result
+class Variable:
+    __slots__ = ('name',)
+
+    def __init__(self, name):
+        self.name = name
 
 
 class Calculator():
+    _FUNCTIONS = {'EXP': Function(math.exp, 'exp'),
+                  'LOG': Function(math.log, 'log'),
+                  'SIN': Function(math.sin, 'sin'),
+                  'COS': Function(math.cos, 'cos'),
+                  'SQRT': Function(math.sqrt, 'sqrt')}
+
+    _OPERATORS = {'ADD': Operator(operator.add, 0, 'add'),
+                  'MULTIPLY': Operator(operator.mul, 1, 'multiply'),
+                  'DIVIDE': Operator(operator.truediv, 1, 'divide'),
+                  'SUBTRACT': Operator(operator.sub, 0, 'subtract')}
+
+    _TOKEN_RE = re.compile(
+        "(?P<num>[-0123456789.]+)"
+        + "|(?P<func>" + '|'.join(_FUNCTIONS.keys()) + ")"
+        + "|(?P<op>" + '|'.join(_OPERATORS.keys()) + ")"
+        + "|(?P<lparen>\\()|(?P<rparen>\\))"
+        + "|(?P<var>[A-Z_][A-Z0-9_]*?(?=[^A-Z0-9_]|$|"
+        + '|'.join(_OPERATORS.keys()) + "))")
+
     def __init__(self):
-        self.functions = {'EXP': Function(numpy.exp),
-                          'LOG': Function(numpy.log),
-                          'SIN': Function(numpy.sin),
-                          'COS': Function(numpy.cos),
-                          'SQRT': Function(numpy.sqrt)}
+        self.functions = Calculator._FUNCTIONS
+        self.operators = Calculator._OPERATORS
 
-        self.operators = {'ADD': Operator(numpy.add, 0),
-                          'MULTIPLY': Operator(numpy.multiply, 1),
-                          'DIVIDE': Operator(numpy.divide, 1),
-                          'SUBTRACT': Operator(numpy.subtract, 0)}
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _folded_rpn(text):
+        return Calculator._compile_rpn(text)
 
-        self.output_queue = Queue()
+    @staticmethod
+    @lru_cache(maxsize=512)
+    def _compile(text):
+        return Calculator._compile_program(Calculator._folded_rpn(text))
 
     def evaluate_rpn(self, rpn):
-        stack = Stack()
-        while not rpn.is_empty():
-            item = rpn.pop()
-            if isinstance(item, numbers.Number):
-                stack.push(item)
-            elif isinstance(item, Function):
-                stack.push(item.execute(stack.pop()))
+        return self._run_program(self._compile_program(self._drain(rpn)))
+
+    @staticmethod
+    def _drain(queue):
+        tokens = []
+        push = tokens.append
+        pop = queue.pop
+        for _ in range(queue.size()):
+            push(pop())
+        return tokens
+
+    @staticmethod
+    def _compile_program(tokens):
+        program = []
+        add_step = program.append
+        for item in tokens:
+            if isinstance(item, Function):
+                add_step(lambda stack, func=item.func: stack.append(func(stack.pop())))
             elif isinstance(item, Operator):
-                num_2 = stack.pop()
-                num_1 = stack.pop()
-                stack.push(item.execute(num_1, num_2))
+                add_step(lambda stack, func=item.operator: stack.append(func(stack.pop(-2), stack.pop())))
+            elif isinstance(item, Variable):
+                raise ValueError("Unknown variable: " + item.name)
+            else:
+                add_step(lambda stack, value=item: stack.append(value))
+        return tuple(program)
+
+    @staticmethod
+    def _run_program(program):
+        stack = []
+        for step in program:
+            step(stack)
         return stack.pop()
 
     def evaluate_notation(self, notation):
-        op_stack = Stack()
-        while not notation.is_empty():
-            item = notation.pop()
-            if isinstance(item, numbers.Number):
-                self.output_queue.push(item)
-            elif isinstance(item, Function):
-                op_stack.push(item)
-            elif item == '(':
-                op_stack.push(item)
-            elif item == ')':
-                while op_stack.peek() != '(':
-                    self.output_queue.push(op_stack.pop())
-                if op_stack.peek() == '(':
-                    op_stack.pop()
-                else:
-                    self.output_queue.push(op_stack.pop())
-            elif isinstance(item, Operator):
-                while not op_stack.is_empty():
-                    if op_stack.peek() == "(":
+        output_queue = Queue()
+        push = output_queue.push
+        for item in self._shunt(self._drain(notation)):
+            push(item)
+        return output_queue
+
+    @staticmethod
+    def _shunt(tokens):
+        output = []
+        op_stack = []
+        out_push = output.append
+        op_push = op_stack.append
+        op_pop = op_stack.pop
+        for opcode, item in tokens:
+            if opcode == TOK_NUM or opcode == TOK_VAR:
+                out_push(item)
+            elif opcode == TOK_FUNC or opcode == TOK_LPAREN:
+                op_push((opcode, item))
+            elif opcode == TOK_RPAREN:
+                while op_stack and op_stack[-1][0] != TOK_LPAREN:
+                    out_push(op_pop()[1])
+                if not op_stack:
+                    raise ValueError("Unbalanced parentheses: unexpected ')'")
+                op_pop()
+            elif opcode == TOK_OP:
+                while op_stack:
+                    top_opcode, top = op_stack[-1]
+                    if top_opcode == TOK_LPAREN:
                         break
-                    if isinstance(op_stack.peek(), Operator):
-                        if op_stack.peek().strength < item.strength:
-                            break
-                    self.output_queue.push(op_stack.pop())
-                op_stack.push(item)
-        while not op_stack.is_empty():
-            self.output_queue.push(op_stack.pop())
+                    if top_opcode == TOK_OP and top.strength < item.strength:
+                        break
+                    out_push(op_pop()[1])
+                op_push((opcode, item))
+        while op_stack:
+            opcode, item = op_pop()
+            if opcode == TOK_LPAREN:
+                raise ValueError("Unbalanced parentheses: missing ')'")
+            out_push(item)
 
-        return self.output_queue
+        return output
 
     def parser(self, text):
         output = Queue()
-        text = text.replace(' ', '').upper()
-        func_targets = '|'.join(['^' + func for func in self.functions.keys()])
-        op_targets = '|'.join(['^' + op for op in self.operators.keys()])
-        while len(text) > 0:
-
-            number = re.search("^[-0123456789.]+", text)
-            if number is not None:
-                output.push(float(number.group(0)))
-                text = text[number.end(0):]
-
-            func = re.search(func_targets, text)
-            if func is not None:
-                output.push(self.functions[func.group(0)])
-                text = text[func.end(0):]
-
-            operator = re.search(op_targets, text)
-            if operator is not None:
-                output.push(self.operators[operator.group(0)])
-                text = text[operator.end(0):]
-
-            parentheses = re.search("^[()]", text)
-            if parentheses is not None:
-                output.push(parentheses.group(0))
-                text = text[parentheses.end(0):]
-
+        push = output.push
+        for token in self._lex(text):
+            push(token)
         return output
 
+    @classmethod
+    def _lex(cls, text):
+        text = text.translate(_NORMALIZE)
+        length = len(text)
+        pos = 0
+        while pos < length:
+            char = text[pos]
+            if char in _DIGITS or (char == '-' and pos + 1 < length and text[pos + 1] in _DIGITS):
+                end = pos + 1
+                while end < length and text[end] in _NUMBER_CHARS:
+                    end += 1
+                yield TOK_NUM, float(text[pos:end])
+                pos = end
+                continue
+
+            token = cls._TOKEN_RE.match(text, pos)
+            if token is None:
+                raise ValueError("Invalid token at: " + text[pos:])
+
+            if token.lastgroup == 'num':
+                yield TOK_NUM, float(token.group(0))
+            elif token.lastgroup == 'func':
+                yield TOK_FUNC, cls._FUNCTIONS[token.group(0)]
+            elif token.lastgroup == 'op':
+                yield TOK_OP, cls._OPERATORS[token.group(0)]
+            elif token.lastgroup == 'lparen':
+                yield TOK_LPAREN, None
+            elif token.lastgroup == 'rparen':
+                yield TOK_RPAREN, None
+            else:
+                yield TOK_VAR, Variable(token.group(0))
+            pos = token.end(0)
+
+    @classmethod
+    def _parse_to_rpn(cls, text):
+        return cls._shunt(cls._lex(text))
+
+    @classmethod
+    def _compile_rpn(cls, text):
+        return cls._fold_constants(cls._parse_to_rpn(text))
+
+    @staticmethod
+    def _fold_constants(tokens):
+        folded = []
+        push = folded.append
+        pop = folded.pop
+        for item in tokens:
+            if isinstance(item, Function) and folded and isinstance(folded[-1], numbers.Number):
+                push(item.execute(pop()))
+            elif (isinstance(item, Operator) and len(folded) >= 2
+                  and isinstance(folded[-1], numbers.Number) and isinstance(folded[-2], numbers.Number)):
+                num_2 = pop()
+                num_1 = pop()
+                push(item.execute(num_1, num_2))
+            else:
+                push(item)
+        return tuple(folded)
+
+    def compile(self, text):
+        program = self._compile(text)
+        return lambda: self._run_program(program)
+
     def calculate_expression(self, text):
-        return self.evaluate_rpn(self.evaluate_notation(self.parser(text)))
+        return self._run_program(self._compile(text))
+
+    def calculate_expression_batch(self, text, values):
+        """Evaluates the expression element-wise over arrays of variable values
+
+        Variable names are case-insensitive like the rest of the expression, so the keys of values
+        are uppercased. A key that does not lex to exactly one variable, such as 'cost' (COS T) or
+        'addend' (ADD END), raises ValueError.
+        """
+        import numpy
+
+        arrays = {}
+        for name, value in values.items():
+            tokens = list(self._lex(name))
+            if len(tokens) != 1 or tokens[0][0] != TOK_VAR:
+                raise ValueError("Invalid variable name: " + name)
+            arrays[tokens[0][1].name] = numpy.asarray(value, dtype=float)
+        stack = []
+        push = stack.append
+        pop = stack.pop
+        for item in self._folded_rpn(text):
+            if isinstance(item, Variable):
+                if item.name not in arrays:
+                    raise ValueError("Unknown variable: " + item.name)
+                push(arrays[item.name])
+            elif isinstance(item, Function):
+                func = item.func if item.vector_name is None else getattr(numpy, item.vector_name)
+                push(func(pop()))
+            elif isinstance(item, Operator):
+                num_2 = pop()
+                num_1 = pop()
+                func = item.operator if item.vector_name is None else getattr(numpy, item.vector_name)
+                push(func(num_1, num_2))
+            else:
+                push(item)
+        return stack.pop()
 
 
 def test():
@@ -264,8 +471,11 @@ def main():
         try:
             expression = input("Enter expression: ")
             print("The answer is", calc.calculate_expression(expression))
-        except KeyboardInterrupt:
+        except (ArithmeticError, ValueError) as error:
+            print("Could not calculate expression:", error)
+        except (KeyboardInterrupt, EOFError):
             print("\nBye!")
             break
 
-main()
\ No newline at end of file
+if __name__ == "__main__":
+    main()
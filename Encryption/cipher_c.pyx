@@ -0,0 +1,75 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+"""C implementations of the per-character cipher loops, build with: python setup.py build_ext --inplace
+"""
+
+__author__ = "Peter Skaar Nordby"
+
+
+cdef inline unsigned char wrap(long long value, int alphabet_start, int alphabet_size):
+    return <unsigned char>((value - alphabet_start) % alphabet_size + alphabet_start)
+
+
+cpdef bytes caesar_encode(const unsigned int[:] msg, long long key, int alphabet_start, int alphabet_size):
+    """Shifts every code point in msg by key within the alphabet
+
+    Args:
+        msg (memoryview): Message as uint32 code points
+        key (int): The encoding key
+        alphabet_start (int): First character of the alphabet
+        alphabet_size (int): Number of characters in the alphabet
+
+    Returns:
+        bytes: Encoded message
+    """
+    cdef Py_ssize_t i, n = msg.shape[0]
+    cdef bytearray out = bytearray(n)
+    cdef unsigned char[:] view = out
+    for i in range(n):
+        view[i] = wrap(msg[i] + key, alphabet_start, alphabet_size)
+    return bytes(out)
+
+
+cpdef bytes multiplication_encode(const unsigned int[:] msg, long long key, int alphabet_start, int alphabet_size):
+    """Multiplies every code point in msg by key within the alphabet
+
+    Args:
+        msg (memoryview): Message as uint32 code points
+        key (int): The encoding key
+        alphabet_start (int): First character of the alphabet
+        alphabet_size (int): Number of characters in the alphabet
+
+    Returns:
+        bytes: Encoded message
+    """
+    cdef Py_ssize_t i, n = msg.shape[0]
+    cdef bytearray out = bytearray(n)
+    cdef unsigned char[:] view = out
+    for i in range(n):
+        view[i] = wrap(msg[i] * key, alphabet_start, alphabet_size)
+    return bytes(out)
+
+
+cpdef bytes unbreakable_encode(const unsigned int[:] msg, const long long[:] key, int alphabet_start,
+                               int alphabet_size):
+    """Shifts every code point in msg by the repeating keyword within the alphabet
+
+    Args:
+        msg (memoryview): Message as uint32 code points
+        key (memoryview): The encoding key as int64 values
+        alphabet_start (int): First character of the alphabet
+        alphabet_size (int): Number of characters in the alphabet
+
+    Returns:
+        bytes: Encoded message
+    """
+    cdef Py_ssize_t i, j = 0, n = msg.shape[0], key_length = key.shape[0]
+    cdef bytearray out = bytearray(n)
+    cdef unsigned char[:] view = out
+    if key_length == 0:
+        raise ZeroDivisionError("The key must not be empty")
+    for i in range(n):
+        view[i] = wrap(msg[i] + key[j], alphabet_start, alphabet_size)
+        j += 1
+        if j == key_length:
+            j = 0
+    return bytes(out)
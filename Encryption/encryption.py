@@ -1,9 +1,25 @@
+import math
+import multiprocessing
+import os
 import random
 import re
-from crypto_utils import extended_gcd, modular_inverse, generate_random_prime, blocks_from_text, text_from_blocks
+import unittest
+from unittest import mock
+import numpy as np
+from crypto_utils import modular_inverse, generate_random_prime, blocks_from_text, text_from_blocks
+try:
+    import numba_kernels
+except ImportError:
+    numba_kernels = None
+try:
+    import cipher_c
+except ImportError:
+    cipher_c = None
 
 __author__ = "Peter Skaar Nordby"
 
+NON_ALPHANUMERIC = re.compile("[^0-9a-zA-Z]+")
+
 
 class Cipher():
     """Cipher superclass with dummy methods for generating keys, encoding and decoding and method for verifying the cipher
@@ -28,6 +44,7 @@ class Cipher():
 class Caesar(Cipher):
     """Uses key to shift alphabet by a number of places
     """
+    _tables = {}
 
     def generate_key(self):
         """Generates a random key between 0 and the size of the alphabet
@@ -47,11 +64,30 @@ class Caesar(Cipher):
         Returns:
             str: Encoded message
         """
-        encoded_msg = ""
-        for char in msg:
-            encoded_msg += chr((ord(char) + key - self.alphabet_start) %
-                               self.alphabet_size + self.alphabet_start)
-        return encoded_msg
+        if msg.isascii():
+            return msg.translate(self.translation_table(key))
+        codes = np.frombuffer(msg.encode('utf-32-le'), dtype=np.uint32)
+        if cipher_c is not None:
+            return cipher_c.caesar_encode(codes, key, self.alphabet_start, self.alphabet_size).decode('ascii')
+        buf = codes.astype(np.int64)
+        encoded = (buf + key - self.alphabet_start) % self.alphabet_size + self.alphabet_start
+        return encoded.astype(np.uint8).tobytes().decode('ascii')
+
+    def translation_table(self, key):
+        """Returns the cached str.translate table mapping every ASCII character for the given key
+
+        Args:
+            key (int): The encoding key
+
+        Returns:
+            dict: Translation table
+        """
+        # Equivalent keys share a table, and subclasses with another alphabet get their own
+        cache_key = (self.alphabet_start, self.alphabet_size, key % self.alphabet_size)
+        if cache_key not in self._tables:
+            self._tables[cache_key] = {char: (char + key - self.alphabet_start) % self.alphabet_size
+                                       + self.alphabet_start for char in range(128)}
+        return self._tables[cache_key]
 
     def decode(self, key, msg):
         """Decodes the message with the given key
@@ -69,6 +105,7 @@ class Caesar(Cipher):
 class Multiplication(Cipher):
     """Uses key to map each letter to a new letter by multiplication
     """
+    _tables = {}
 
     def generate_key(self):
         """Generates random valid key between 0 and the size of the alphabet
@@ -77,7 +114,7 @@ class Multiplication(Cipher):
             int: key
         """
         key = random.randint(0, self.alphabet_size)
-        while extended_gcd(key, self.alphabet_size)[0] != 1:
+        while math.gcd(key, self.alphabet_size) != 1:
             key = random.randint(0, self.alphabet_size)
         return key
 
@@ -91,11 +128,30 @@ class Multiplication(Cipher):
         Returns:
             str: Encoded message
         """
-        encoded_msg = ""
-        for char in msg:
-            encoded_msg += chr((ord(char) * key - self.alphabet_start) %
-                               self.alphabet_size + self.alphabet_start)
-        return encoded_msg
+        if msg.isascii():
+            return msg.translate(self.translation_table(key))
+        codes = np.frombuffer(msg.encode('utf-32-le'), dtype=np.uint32)
+        if cipher_c is not None:
+            return cipher_c.multiplication_encode(codes, key, self.alphabet_start, self.alphabet_size).decode('ascii')
+        buf = codes.astype(np.int64)
+        encoded = (buf * key - self.alphabet_start) % self.alphabet_size + self.alphabet_start
+        return encoded.astype(np.uint8).tobytes().decode('ascii')
+
+    def translation_table(self, key):
+        """Returns the cached str.translate table mapping every ASCII character for the given key
+
+        Args:
+            key (int): The encoding key
+
+        Returns:
+            dict: Translation table
+        """
+        # Equivalent keys share a table, and subclasses with another alphabet get their own
+        cache_key = (self.alphabet_start, self.alphabet_size, key % self.alphabet_size)
+        if cache_key not in self._tables:
+            self._tables[cache_key] = {char: (char * key - self.alphabet_start) % self.alphabet_size
+                                       + self.alphabet_start for char in range(128)}
+        return self._tables[cache_key]
 
     def decode(self, key, msg):
         """Decodes the message with the given key
@@ -161,10 +217,7 @@ class Unbreakable(Cipher):
             list: key
         """
         keyword = input("Keyword: ")
-        key = []
-        for char in keyword:
-            key.append(ord(char))
-        return key
+        return [ord(char) for char in keyword]
 
     def encode(self, key, msg):
         """Encodes the message with the given key
@@ -176,11 +229,14 @@ class Unbreakable(Cipher):
         Returns:
             str: Encoded message
         """
-        encoded_msg = ""
-        for i, char in enumerate(msg):
-            encoded_msg += chr((ord(char) + key[i % len(key)] - self.alphabet_start) %
-                               self.alphabet_size + self.alphabet_start)
-        return encoded_msg
+        codes = np.frombuffer(msg.encode('utf-32-le'), dtype=np.uint32)
+        if cipher_c is not None:
+            return cipher_c.unbreakable_encode(codes, np.asarray(key, dtype=np.int64), self.alphabet_start,
+                                               self.alphabet_size).decode('ascii')
+        buf = codes.astype(np.int64)
+        key_arr = np.tile(np.asarray(key, dtype=np.int64), len(msg) // len(key) + 1)[:len(msg)]
+        encoded = (buf + key_arr - self.alphabet_start) % self.alphabet_size + self.alphabet_start
+        return encoded.astype(np.uint8).tobytes().decode('ascii')
 
     def decode(self, key, msg):
         """Decodes the message with the given key
@@ -192,10 +248,7 @@ class Unbreakable(Cipher):
         Returns:
             str: Decoded message
         """
-        decoding_key = []
-        for val in key:
-            decoding_key.append((self.alphabet_size - val) %
-                                self.alphabet_size)
+        decoding_key = (self.alphabet_size - np.asarray(key, dtype=np.int64)) % self.alphabet_size
         return self.encode(decoding_key, msg)
 
 
@@ -209,7 +262,7 @@ class RSA(Cipher):
         """Generates key pairs based on random primes
 
         Returns:
-            tuple: public and private key pair
+            tuple: public key (n, e) and private key (n, d, p, q, dp, dq, qinv) pair
         """
         p = generate_random_prime(self.bits)
         q = generate_random_prime(self.bits)
@@ -218,44 +271,40 @@ class RSA(Cipher):
         n = p * q
         phi = (p-1) * (q-1)
         e = random.randint(3, phi-1)
-        while extended_gcd(e, phi)[0] != 1:
+        while math.gcd(e, phi) != 1:
             e = random.randint(3, phi-1)
         d = modular_inverse(e, phi)
-        return (n, e), (n, d)
+        return (n, e), (n, d, p, q, d % (p-1), d % (q-1), modular_inverse(q, p))
 
     def encode(self, key, msg):
         """Encodes the message with the given key
 
         Args:
-            key (tuple): The encoding key
+            key (tuple): Public key (n, e) from generate_key
             msg (str): The message to be encoded
 
         Returns:
             list: Encoded message in list of integers
         """
-        encoded_msg = []
-        n = key[0]
-        e = key[1]
-        blocks = blocks_from_text(msg, self.block_length)
-        for block in blocks:
-            encoded_msg.append((block ** e) % n)
-        return encoded_msg
+        n, e = key
+        return [pow(block, e, n) for block in blocks_from_text(msg, self.block_length)]
 
     def decode(self, key, msg):
         """Decodes the message with the given key
 
         Args:
-            key (tuple): The decoding key
-            msg (str): List of integers to be decoded
+            key (tuple): Private key (n, d, p, q, dp, dq, qinv) from generate_key
+            msg (list): List of integers to be decoded
 
         Returns:
             str: Decoded message
         """
         decoded_msg = []
-        n = key[0]
-        d = key[1]
+        _, _, p, q, dp, dq, qinv = key
         for block in msg:
-            decoded_msg.append((block ** d) % n)
+            m1 = pow(block, dp, p)
+            m2 = pow(block, dq, q)
+            decoded_msg.append(m2 + (qinv * (m1 - m2)) % p * q)
         return text_from_blocks(decoded_msg, self.block_length)
 
     def verify(self, key, msg):
@@ -309,16 +358,41 @@ class Receiver(Person):
 class Hacker(Receiver):
     """Hacker class to brute force the various Ciphers
     """
-
-    def __init__(self, encoded_msg, cipher):
+    _words = None
+    _word_hashes = None
+    _word_keys = None
+    _word_lengths = None
+    parallel_min_length = 128
+    multiplication_keys = [key for key in range(Cipher.alphabet_size) if math.gcd(key, Cipher.alphabet_size) == 1]
+
+    def __init__(self, encoded_msg, cipher, hash_words=True):
         super().__init__(cipher)
         self.encoded_msg = encoded_msg
         self.most_likely_msg = ""
         self.max_count = 0
-        file = open("english_words.txt")
-        contents = file.read()
-        self.words = set(contents.split("\n"))
-        file.close()
+        if Hacker._words is None:
+            with open("english_words.txt") as file:
+                Hacker._words = frozenset(word.lower() for word in file.read().split("\n") if word)
+        if hash_words and Hacker._word_hashes is None and numba_kernels is not None:
+            Hacker._word_hashes = numba_kernels.hash_words(
+                np.frombuffer("\n".join(Hacker._words).encode(), dtype=np.uint8))
+        self.words = Hacker._words
+        self.word_hashes = Hacker._word_hashes
+
+    @classmethod
+    def word_keys(cls):
+        """Returns every english word as an Unbreakable key, built once per process
+
+        Returns:
+            tuple: Sorted words as a zero padded uint8 matrix of character codes, and the length of each word
+        """
+        if cls._word_keys is None:
+            words = sorted(cls._words)
+            width = max(len(word) for word in words)
+            padded = "".join(word.ljust(width, "\0") for word in words).encode("latin1")
+            cls._word_keys = np.frombuffer(padded, dtype=np.uint8).reshape(len(words), width)
+            cls._word_lengths = np.array([len(word) for word in words])
+        return cls._word_keys, cls._word_lengths
 
     def count_english_words(self, decoded_msg):
         """Counts the number of english words in the decoded message
@@ -329,11 +403,10 @@ class Hacker(Receiver):
         Returns:
             int: Number of english words
         """
-        decoded_msg = re.sub("[^0-9a-zA-Z]+", " ", decoded_msg)
-        decoded_msg_list = decoded_msg.split()
+        decoded_msg_list = NON_ALPHANUMERIC.sub(" ", decoded_msg).lower().split()
         count = 0
         for word in decoded_msg_list:
-            if word.lower() in self.words:
+            if word in self.words:
                 count += 1
         return count
 
@@ -342,46 +415,255 @@ class Hacker(Receiver):
 
         Args:
             key (int/tuple/list): The key to check
+
+        Returns:
+            int: Number of english words
         """
         self.key = key
-        decoded_msg = self.operate_cipher(self.encoded_msg)
+        return self.check_decoded(self.operate_cipher(self.encoded_msg))
+
+    def check_decoded(self, decoded_msg):
+        """Checks if this decoding is the most likely one so far
+
+        Args:
+            decoded_msg (str): Decoded message
+
+        Returns:
+            int: Number of english words
+        """
         count = self.count_english_words(decoded_msg)
         if count > self.max_count:
             self.max_count = count
             self.most_likely_msg = decoded_msg
+        return count
+
+    def is_unbeatable(self):
+        """Checks if the most likely message has as many english words as any decoding can have
+
+        Words are separated by at least one other character, so no decoding of the message has more
+        than half its length, rounded up, in words
+
+        Returns:
+            bool: True if no other key can do better
+        """
+        return self.max_count >= (len(self.encoded_msg) + 1) // 2
 
     def brute_force(self):
         """Brute forces all possible keys to find possible original message
 
         Returns:
-            str: Most likely original message
+            tuple: Most likely original message and its number of english words
+        """
+        strategies = {Caesar: self.brute_force_caesar,
+                      Multiplication: self.brute_force_multiplication,
+                      Affine: self.brute_force_affine,
+                      Unbreakable: self.brute_force_unbreakable}
+        if type(self.cipher) not in strategies:
+            raise TypeError("Can not brute force " + type(self.cipher).__name__)
+        return strategies[type(self.cipher)]()
+
+    def encoded_codes(self):
+        """Returns the encoded message as code points
+
+        Returns:
+            np.ndarray: int64 code points of the encoded message
+        """
+        return np.frombuffer(self.encoded_msg.encode('utf-32-le'), dtype=np.uint32).astype(np.int64)
+
+    def multiplication_inverses(self):
+        """Returns the modular inverse of every valid multiplication key
+
+        Returns:
+            np.ndarray: int64 inverse for each key, -1 for invalid keys
+        """
+        inverses = np.full(self.cipher.alphabet_size, -1, dtype=np.int64)
+        for key in self.multiplication_keys:
+            inverses[key] = modular_inverse(key, self.cipher.alphabet_size)
+        return inverses
+
+    def check_candidates(self, keys, candidates):
+        """Checks each row of decoded code points as the decoding under the matching key
+
+        Args:
+            keys (iterable): The keys, one for each row
+            candidates (np.ndarray): Decoded messages as a matrix of code points
+        """
+        for key, candidate in zip(keys, candidates.astype(np.uint8)):
+            self.key = key
+            self.check_decoded(candidate.tobytes().decode('ascii'))
+
+    def brute_force_caesar(self):
+        """Brute forces every Caesar key
+
+        Returns:
+            tuple: Most likely original message and its number of english words
         """
-        if isinstance(self.cipher, (Caesar, Multiplication)):
-            for key in range(0, self.cipher.alphabet_size):
-                if isinstance(self.cipher, Multiplication) and extended_gcd(key, self.cipher.alphabet_size)[0] != 1:
-                    continue
-                self.check_key(key)
+        size = self.cipher.alphabet_size
+        start = self.cipher.alphabet_start
+        buf = self.encoded_codes()
+        if self.word_hashes is not None:
+            counts = numba_kernels.brute_force_caesar(buf, self.word_hashes, start, size)
+            if counts.max() > 0:
+                self.check_key(int(np.argmax(counts)))
             return self.most_likely_msg, self.max_count
 
-        if isinstance(self.cipher, Affine):
-            for c_key in range(0, self.cipher.alphabet_size):
-                for m_key in range(0, self.cipher.alphabet_size):
-                    if extended_gcd(m_key, self.cipher.alphabet_size)[0] != 1:
-                        continue
-                    self.check_key((m_key, c_key))
+        keys = np.arange(size)
+        self.check_candidates(range(size), (buf[None, :] - keys[:, None] - start) % size + start)
+        return self.most_likely_msg, self.max_count
+
+    def brute_force_multiplication(self):
+        """Brute forces every valid Multiplication key
+
+        Returns:
+            tuple: Most likely original message and its number of english words
+        """
+        size = self.cipher.alphabet_size
+        start = self.cipher.alphabet_start
+        buf = self.encoded_codes()
+        inverses = self.multiplication_inverses()
+        if self.word_hashes is not None:
+            counts = numba_kernels.brute_force_multiplication(buf, self.word_hashes, inverses, start, size)
+            if counts.max() > 0:
+                self.check_key(int(np.argmax(counts)))
             return self.most_likely_msg, self.max_count
 
-        if isinstance(self.cipher, Unbreakable):
-            for word in self.words:
-                try:
-                    encryption_key = []
-                    for char in word:
-                        encryption_key.append(ord(char))
-                    self.check_key(encryption_key)
-                except ZeroDivisionError:
-                    continue
+        valid_inverses = inverses[self.multiplication_keys]
+        self.check_candidates(self.multiplication_keys,
+                              (buf[None, :] * valid_inverses[:, None] - start) % size + start)
+        return self.most_likely_msg, self.max_count
+
+    def brute_force_affine(self):
+        """Brute forces every valid Affine key pair
+
+        Returns:
+            tuple: Most likely original message and its number of english words
+        """
+        size = self.cipher.alphabet_size
+        if self.word_hashes is not None:
+            counts = numba_kernels.brute_force_affine(self.encoded_codes(), self.word_hashes,
+                                                      self.multiplication_inverses(), self.cipher.alphabet_start, size)
+            if counts.max() > 0:
+                c_key, m_key = np.unravel_index(np.argmax(counts), counts.shape)
+                self.check_key((int(m_key), int(c_key)))
             return self.most_likely_msg, self.max_count
 
+        for c_key in range(0, size):
+            for m_key in self.multiplication_keys:
+                self.check_key((m_key, c_key))
+                if self.is_unbeatable():
+                    return self.most_likely_msg, self.max_count
+        return self.most_likely_msg, self.max_count
+
+    def score_word_key(self, index):
+        """Counts the english words in the message decoded with the index-th word key
+
+        Args:
+            index (int): Index of the word in word_keys
+
+        Returns:
+            int: Number of english words
+        """
+        keys, lengths = self.word_keys()
+        self.key = keys[index, :lengths[index]]
+        return self.count_english_words(self.operate_cipher(self.encoded_msg))
+
+    def brute_force_unbreakable(self):
+        """Brute forces Unbreakable with every english word as keyword
+
+        Returns:
+            tuple: Most likely original message and its number of english words
+        """
+        keys, lengths = self.word_keys()
+        if (os.cpu_count() or 1) == 1 or len(self.encoded_msg) < self.parallel_min_length:
+            # Starting the workers costs more than scoring every keyword here
+            counts = [self.score_word_key(index) for index in range(len(lengths))]
+        else:
+            # Spawn fresh workers, forking after numba has started its threading layer can deadlock
+            context = multiprocessing.get_context("spawn")
+            with context.Pool(initializer=init_scoring_worker, initargs=(self.encoded_msg, self.cipher)) as pool:
+                counts = pool.map(score_word_key, range(len(lengths)), chunksize=1024)
+        if counts and max(counts) > 0:
+            best = counts.index(max(counts))
+            self.check_key(keys[best, :lengths[best]])
+        return self.most_likely_msg, self.max_count
+
+
+scoring_hacker = None
+
+
+def init_scoring_worker(encoded_msg, cipher):
+    """Sets up the Hacker used by score_word_key in a brute force worker process
+
+    Args:
+        encoded_msg (str): The encoded message
+        cipher (Cipher): The cipher to brute force
+    """
+    global scoring_hacker
+    scoring_hacker = Hacker(encoded_msg, cipher, hash_words=False)
+    scoring_hacker.word_keys()
+
+
+def score_word_key(index):
+    """Counts the english words in the message decoded with the index-th word key, run in a brute force worker process
+
+    Args:
+        index (int): Index of the word in Hacker.word_keys
+
+    Returns:
+        int: Number of english words
+    """
+    return scoring_hacker.score_word_key(index)
+
+
+class TestCipherC(unittest.TestCase):
+    @unittest.skipIf(cipher_c is None, "requires the built cipher_c extension")
+    def test_matches_numpy_fallback(self):
+        msg = "Hællo, wörld! ~ 0123 €"
+        ciphers = ((Caesar(), (0, 7, 94, 200, -3)),
+                   (Multiplication(), (1, 2, 7, 96, 191)),
+                   (Unbreakable(), ([1], [ord(char) for char in "pizza"], [0, 94, 200])))
+        for cipher, keys in ciphers:
+            for key in keys:
+                encoded = cipher.encode(key, msg)
+                with mock.patch(__name__ + ".cipher_c", None):
+                    self.assertEqual(cipher.encode(key, msg), encoded)
+
+
+class TestRSA(unittest.TestCase):
+    def test_crt_decode(self):
+        cipher = RSA()
+        for _ in range(20):
+            public_key, private_key = cipher.generate_key()
+            n, d = private_key[:2]
+            blocks = cipher.encode(public_key, "Hello, World!")
+            self.assertEqual([pow(block, d, n) for block in blocks],
+                             blocks_from_text("Hello, World!", cipher.block_length))
+            self.assertEqual(cipher.decode(private_key, blocks), "Hello, World!")
+
+
+class TestHacker(unittest.TestCase):
+    def test_affine_finds_best_count(self):
+        affine = Affine()
+        for msg, count in (("then more", 3), ("a make", 2), ("go it", 2),
+                           ("hello world this is a secret message", 6)):
+            encoded = affine.encode((2, 5), msg)
+            hacker = Hacker(encoded, affine)
+            hacker.word_hashes = None
+            self.assertEqual(hacker.brute_force()[1], count)
+            self.assertEqual(Hacker(encoded, affine).brute_force(), hacker.brute_force())
+
+    def test_caesar_then_unbreakable(self):
+        msg = "hello world this is a secret message"
+        caesar = Caesar()
+        self.assertEqual(Hacker(caesar.encode(7, msg), caesar).brute_force()[0], msg)
+        unbreakable = Unbreakable()
+        encoded = unbreakable.encode([ord(char) for char in "secret"], msg)
+        serial = Hacker(encoded, unbreakable).brute_force()
+        self.assertEqual(serial[0], msg)
+        with mock.patch.object(Hacker, "parallel_min_length", 0), \
+                mock.patch(__name__ + ".os.cpu_count", return_value=2):
+            self.assertEqual(Hacker(encoded, unbreakable).brute_force(), serial)
+
 
 def test():
     cipher_choice = input("What cipher do you want to use? (c, m, a, u, r) ")
@@ -409,4 +691,5 @@ def test():
         print("\nBrute forced:", brute_forced[0], "\nEnglish words:", brute_forced[1])
 
 
-test()
+if __name__ == "__main__":
+    test()
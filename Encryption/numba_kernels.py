@@ -0,0 +1,136 @@
+import numpy as np
+from numba import njit, prange
+
+__author__ = "Peter Skaar Nordby"
+
+FNV_OFFSET = np.uint64(0xcbf29ce484222325)
+FNV_PRIME = np.uint64(0x100000001b3)
+
+
+@njit(cache=True)
+def hash_words(data):
+    """Hashes every newline separated word in the byte array with 64-bit FNV-1a
+
+    Args:
+        data (np.ndarray): uint8 contents of the word list
+
+    Returns:
+        np.ndarray: Sorted uint64 hashes of the words
+    """
+    hashes = np.empty(data.shape[0] + 1, dtype=np.uint64)
+    count = 0
+    h = FNV_OFFSET
+    length = 0
+    for i in range(data.shape[0]):
+        char = data[i]
+        if char == 10 or char == 13:
+            if length > 0:
+                hashes[count] = h
+                count += 1
+            h = FNV_OFFSET
+            length = 0
+        else:
+            h = (h ^ np.uint64(char)) * FNV_PRIME
+            length += 1
+    if length > 0:
+        hashes[count] = h
+        count += 1
+    return np.sort(hashes[:count])
+
+
+@njit(cache=True)
+def count_english_words(buf, hashes):
+    """Counts the alphanumeric words in the buffer whose lowercase hash is in hashes
+
+    Args:
+        buf (np.ndarray): Decoded message as code points
+        hashes (np.ndarray): Sorted uint64 word hashes
+
+    Returns:
+        int: Number of english words
+    """
+    count = 0
+    h = FNV_OFFSET
+    length = 0
+    for i in range(buf.shape[0] + 1):
+        char = buf[i] if i < buf.shape[0] else 0
+        if 65 <= char <= 90:
+            char += 32
+        if 48 <= char <= 57 or 97 <= char <= 122:
+            h = (h ^ np.uint64(char)) * FNV_PRIME
+            length += 1
+        elif length > 0:
+            pos = np.searchsorted(hashes, h)
+            if pos < hashes.shape[0] and hashes[pos] == h:
+                count += 1
+            h = FNV_OFFSET
+            length = 0
+    return count
+
+
+@njit(cache=True)
+def shift(buf, key, alphabet_start, alphabet_size):
+    """Adds key to every code point in the buffer within the alphabet
+
+    Returns:
+        np.ndarray: Shifted code points
+    """
+    return (buf + key - alphabet_start) % alphabet_size + alphabet_start
+
+
+@njit(cache=True)
+def scale(buf, key, alphabet_start, alphabet_size):
+    """Multiplies every code point in the buffer by key within the alphabet
+
+    Returns:
+        np.ndarray: Scaled code points
+    """
+    return (buf * key - alphabet_start) % alphabet_size + alphabet_start
+
+
+@njit(parallel=True, cache=True)
+def brute_force_caesar(buf, hashes, alphabet_start, alphabet_size):
+    """Scores every Caesar decoding key
+
+    Returns:
+        np.ndarray: English word count for each key
+    """
+    counts = np.zeros(alphabet_size, dtype=np.int64)
+    for key in prange(alphabet_size):
+        decoded = shift(buf, alphabet_size - key, alphabet_start, alphabet_size)
+        counts[key] = count_english_words(decoded, hashes)
+    return counts
+
+
+@njit(parallel=True, cache=True)
+def brute_force_multiplication(buf, hashes, inverses, alphabet_start, alphabet_size):
+    """Scores every Multiplication key, where inverses[key] is -1 for invalid keys
+
+    Returns:
+        np.ndarray: English word count for each key, -1 for invalid keys
+    """
+    counts = np.full(alphabet_size, -1, dtype=np.int64)
+    for key in prange(alphabet_size):
+        if inverses[key] < 0:
+            continue
+        decoded = scale(buf, inverses[key], alphabet_start, alphabet_size)
+        counts[key] = count_english_words(decoded, hashes)
+    return counts
+
+
+@njit(parallel=True, cache=True)
+def brute_force_affine(buf, hashes, inverses, alphabet_start, alphabet_size):
+    """Scores every Affine key pair, indexed as counts[caesar_key, multiplication_key]
+
+    Returns:
+        np.ndarray: English word count for each key pair, -1 for invalid pairs
+    """
+    counts = np.full((alphabet_size, alphabet_size), -1, dtype=np.int64)
+    for c_key in prange(alphabet_size):
+        shifted = shift(buf, alphabet_size - c_key, alphabet_start, alphabet_size)
+        for m_key in range(alphabet_size):
+            if inverses[m_key] < 0:
+                continue
+            decoded = scale(shifted, inverses[m_key], alphabet_start, alphabet_size)
+            counts[c_key, m_key] = count_english_words(decoded, hashes)
+    return counts
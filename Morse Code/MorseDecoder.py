@@ -9,6 +9,8 @@ MORSE_CODE = {'.-': 'a', '-...': 'b', '-.-.': 'c', '-..': 'd', '.': 'e', '..-.':
               '..---': '2', '...--': '3', '....-': '4', '.....': '5', '-....': '6', '--...': '7',
               '---..': '8', '----.': '9', '-----': '0'}
 
+DEBOUNCE_SAMPLES = 3                                        #Equal consecutive reads before a button change counts
+
 class MorseDecoder():
     current_symbol = ""
     current_word = ""
@@ -32,36 +34,43 @@ class MorseDecoder():
 
         last_state_BTN = 0                                
         stop = 0
+        gpio_input = GPIO.input
+        last_raw = 0
+        same_reads = 0
+        stable_state = 0
         try:
             while True:
                 time.sleep(0.01)
-                input = GPIO.input(PIN_BTN)
-                input_check = GPIO.input(PIN_BTN)                   #Compare two button inputs to lower chance of false press
+                raw = gpio_input(PIN_BTN)
+                same_reads = same_reads + 1 if raw == last_raw else 1
+                last_raw = raw
+                if same_reads >= DEBOUNCE_SAMPLES:                  #Only trust a reading after it has been stable
+                    stable_state = raw
                 
                 #Goes from low to high (Button is pressed)
-                if last_state_BTN == 0 and input == input_check == 1:
-                    pause = time.time() - stop
+                if last_state_BTN == 0 and stable_state == 1:
+                    pause = time.monotonic_ns() - stop
                     last_state_BTN = 1
-                    start = time.time()
+                    start = time.monotonic_ns()
                     if stop != 0:
-                        if 0.4 < pause < 2:                         #Medium pause signal 0.4 - 2 seconds
+                        if 400_000_000 < pause < 2_000_000_000:     #Medium pause signal 0.4 - 2 seconds
                             print(" ", end="", flush=True)
                             self.process_signal(2)
-                        elif pause > 2:                             #Long pause signal > 2 seconds
+                        elif pause > 2_000_000_000:                 #Long pause signal > 2 seconds
                             print("\n", end="", flush=True)
                             self.process_signal(3)
 
                 #Goes from high to low (Button is released)
-                if last_state_BTN == 1 and input == input_check == 0:
-                    duration = time.time() - start
+                if last_state_BTN == 1 and stable_state == 0:
+                    duration = time.monotonic_ns() - start
                     last_state_BTN = 0
-                    stop = time.time()
-                    if duration < 0.3:                              #Dot < 0.3 seconds
+                    stop = time.monotonic_ns()
+                    if duration < 300_000_000:                      #Dot < 0.3 seconds
                         print(".", end="", flush=True)           
                         self.process_signal(0)
                         #GPIO.output(PIN_RED_LED_0, GPIO.HIGH)   
                         #GPIO.output(PIN_RED_LED_0, GPIO.LOW)
-                    elif duration > 0.3:                            #Dash > 0.3 seconds
+                    elif duration > 300_000_000:                    #Dash > 0.3 seconds
                         print("-", end="", flush=True)                   
                         self.process_signal(1)
                         #GPIO.output(PIN_BLUE_LED, GPIO.HIGH)    
@@ -1,35 +1,12 @@
+from collections import defaultdict
 from random import randint
 import operator
+import numpy as np
 import matplotlib.pyplot as plt
 
 action_values = {"Rock": 0, "Scissors": 1, "Paper": 2}
-action_names = {val: name for name, val in action_values.items()}
-
-
-class Action:
-    """
-    Help class to make moves easier
-    """
-    action_values = {"Rock": 0, "Scissors": 1, "Paper": 2}
-    action_names = {val: name for name, val in action_values.items()}
-
-    def __init__(self, value):
-        if isinstance(value, str):
-            value = self.action_values[value]
-        assert isinstance(value, int) & (value >= 0) & (value < 3)
-        self.value = value
-
-    def __eq__(self, other):
-        return self.value == other.value
-
-    def __gt__(self, other):
-        return (self.value + 1) % 3 == other.value
-
-    def __str__(self):
-        return self.action_names[self.value]
-
-    def who_beats_me(self):
-        return (self.value + 2) % 3
+action_names = ("Rock", "Scissors", "Paper")
+who_beats = (2, 0, 1)
 
 
 class Player:
@@ -42,10 +19,30 @@ class Player:
         self.value = 0
         self.move = ""
         self.name = "Player"
+        self.random_pool = []
+        self.random_pointer = 0
 
     def receive_result(self, other_move):
         self.count[other_move] += 1
 
+    def prepare_random(self, number_of_games):
+        """
+        Draws random moves for all games at once
+        number_of_games (int): Number of random moves to draw
+        """
+        self.random_pool = np.random.randint(0, 3, size=number_of_games).tolist()
+        self.random_pointer = 0
+
+    def random_value(self):
+        """
+        Returns the next pre-drawn random move, or a fresh one when the pool is used up
+        """
+        if self.random_pointer < len(self.random_pool):
+            value = self.random_pool[self.random_pointer]
+            self.random_pointer += 1
+            return value
+        return randint(0, 2)
+
 
 class Random(Player):
     """
@@ -54,8 +51,8 @@ class Random(Player):
     """
 
     def select_action(self):
-        self.value = randint(0, 2)
-        self.move = Action(self.value).__str__()
+        self.value = self.random_value()
+        self.move = action_names[self.value]
 
     def enter_name(self):
         self.name = "Random"
@@ -77,7 +74,7 @@ class Sequence(Player):
 
     def select_action(self):
         self.value = self.sequence[self.pointer]
-        self.move = Action(self.value).__str__()
+        self.move = action_names[self.value]
         self.pointer = (self.pointer + 1) % len(self.sequence)
 
     def enter_name(self):
@@ -97,8 +94,8 @@ class MostCommon(Player):
     def select_action(self):
         self.other_player_most_common_move = max(
             self.count.items(), key=operator.itemgetter(1))[0]
-        self.value = Action(self.other_player_most_common_move).who_beats_me()
-        self.move = Action(self.value).__str__()
+        self.value = who_beats[action_values[self.other_player_most_common_move]]
+        self.move = action_names[self.value]
 
     def enter_name(self):
         self.name = "MostCommon"
@@ -110,55 +107,49 @@ class Historian(Player):
     Chooses its move based on pattern recognition of opponents earlier moves
     """
 
+    dense_remember = 10
+
     def __init__(self, remember):
         Player.__init__(self)
         self.remember = remember
-        self.last_moves = [None] * (self.remember + 1)
-        self.pointer = 0
+        self.num_patterns = 3 ** self.remember
+        # Last remember moves as a base-3 number, and how often each move followed each history
+        self.history_hash = 0
+        self.moves_seen = 0
+        self.sparse = self.remember > self.dense_remember
+        if not self.sparse:
+            self.pattern_count = np.zeros((self.num_patterns, 3), dtype=np.int64)
+        else:
+            # Too many histories to allocate up front, so only store the ones that occur
+            self.pattern_count = defaultdict(lambda: np.zeros(3, dtype=np.int64))
 
     def select_action(self):
         """
         Looks at n last moves and what is most commonly played after n moves based on history
         """
-        if None not in self.last_moves:
-            pattern = tuple()
-            for i in range(self.remember):
-                move = (self.last_moves[(self.pointer - i) %
-                                        (self.remember + 1)], )
-                pattern += move
-            num_used = 0
-            most_used_value = None
-            for i in range(3):
-                if pattern + (action_names[i], ) in self.count:
-                    if num_used < self.count[pattern + (action_names[i], )]:
-                        num_used = self.count[pattern + (action_names[i], )]
-                        most_used_value = i
-            if most_used_value is None:
-                self.play_random()
+        if self.moves_seen >= self.remember:
+            if self.sparse:
+                # Reading must not insert an empty row for a history that has not occurred
+                counts = self.pattern_count.get(self.history_hash)
             else:
-                self.value = Action(most_used_value).who_beats_me()
+                counts = self.pattern_count[self.history_hash]
+            if counts is not None and counts.max() > 0:
+                self.value = who_beats[counts.argmax()]
                 self.move = action_names[self.value]
-        else:
-            self.play_random()
+                return
+        self.play_random()
 
     def play_random(self):
-        self.value = randint(0, 2)
-        self.move = Action(self.value).__str__()
+        self.value = self.random_value()
+        self.move = action_names[self.value]
 
     def receive_result(self, other_move):
         self.count[other_move] += 1
-        self.last_moves[self.pointer] = other_move
-        self.pointer = (self.pointer + 1) % (self.remember + 1)
-        pattern = tuple()
-        if None not in self.last_moves:
-            for i in range(self.remember + 1):
-                move = (self.last_moves[(self.pointer + i) %
-                                        (self.remember + 1)], )
-                pattern += move
-            if pattern in self.count:
-                self.count[pattern] += 1
-            else:
-                self.count[pattern] = 1
+        move_value = action_values[other_move]
+        if self.moves_seen >= self.remember:
+            self.pattern_count[self.history_hash][move_value] += 1
+        self.history_hash = (self.history_hash * 3 + move_value) % self.num_patterns
+        self.moves_seen += 1
 
     def enter_name(self):
         self.name = "Historian (" + str(self.remember) + ")"
@@ -223,10 +214,12 @@ class Tournament:
         self.player_2_points = 0
         self.player_1_avg = 0
         self.player_2_avg = 0
-        self.player_1_avgs = []
-        self.player_2_avgs = []
+        self.player_1_avgs = np.empty(number_of_games)
+        self.player_2_avgs = np.empty(number_of_games)
         self.num_games = number_of_games
         self.should_print = should_print
+        self.player_1.prepare_random(number_of_games)
+        self.player_2.prepare_random(number_of_games)
 
     def arrange_singlegame(self):
         single_game = SingleGame(
@@ -244,10 +237,15 @@ class Tournament:
     def arrange_tournament(self):
         for game in range(self.num_games):
             self.arrange_singlegame()
-            self.player_1_avg = self.player_1_points/(game+1)
-            self.player_2_avg = self.player_2_points/(game+1)
-            self.player_1_avgs.append(self.player_1_avg)
-            self.player_2_avgs.append(self.player_2_avg)
+            self.player_1_avgs[game] = self.player_1_points
+            self.player_2_avgs[game] = self.player_2_points
+        # Turn the running point totals into running averages in one vectorized division
+        games_played = np.arange(1, self.num_games + 1)
+        self.player_1_avgs /= games_played
+        self.player_2_avgs /= games_played
+        if self.num_games > 0:
+            self.player_1_avg = self.player_1_avgs[-1]
+            self.player_2_avg = self.player_2_avgs[-1]
         print("Result after", self.num_games, "games:\n" + self.player_1.name +
               ":", self.player_1_points, "\n" + self.player_2.name + ":", self.player_2_points)
         plt.plot(self.player_2_avgs)